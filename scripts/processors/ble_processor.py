@@ -23,14 +23,21 @@ import sys
 import os
 import json
 import hashlib
-import struct
+import math
+import select
 import subprocess
 import time
+from collections import OrderedDict
 from datetime import datetime, timezone
 from typing import Optional
 
 import numpy as np
 
+try:
+    import orjson  # optional accelerator — stdlib json is the fallback
+except ImportError:
+    orjson = None
+
 
 # --- Configuration ---
 HACKRF_SERIAL = os.environ.get("HACKRF_SERIAL", "")
@@ -39,6 +46,16 @@ VGA_GAIN = int(os.environ.get("HACKRF_VGA_GAIN", "40"))
 SAMPLE_RATE = int(os.environ.get("BLE_SAMPLE_RATE", "4000000"))
 CHANNEL_DWELL_MS = int(os.environ.get("BLE_CHANNEL_DWELL_MS", "200"))
 DEDUP_SECONDS = int(os.environ.get("BLE_DEDUP_SECONDS", "10"))
+# Set BLE_FORCE_DECODE=1 to attempt packet decode even on dwells the
+# energy detector considers empty (debug aid)
+FORCE_DECODE = os.environ.get("BLE_FORCE_DECODE", "") == "1"
+
+# Skip the packet decode pass when a dwell has no bursts and SNR below
+# this many dB — there is nothing for the access-address search to find
+DECODE_MIN_SNR_DB = 3.0
+
+# Dedup LRU capacity — bounds memory without periodic cleanup scans
+DEDUP_MAX_ENTRIES = 4096
 
 # BLE advertising channels
 BLE_CHANNELS = {
@@ -47,30 +64,73 @@ BLE_CHANNELS = {
     39: 2480000000,  # 2480 MHz
 }
 
-# BLE advertising access address
+# BLE advertising access address. The air interface is LSB-first (lowest
+# byte 0xD6 first, LSB of each byte first), matching the bits_to_bytes
+# convention for the PDU — so the correlation pattern is the little-endian
+# unpack of the value, not its MSB-first binary string.
 BLE_ACCESS_ADDRESS = 0x8E89BED6
-BLE_AA_BITS = np.array([int(b) for b in format(BLE_ACCESS_ADDRESS, "032b")], dtype=np.int8)
+BLE_AA_BITS = np.unpackbits(
+    np.frombuffer(BLE_ACCESS_ADDRESS.to_bytes(4, "little"), dtype=np.uint8),
+    bitorder="little",
+).astype(np.int8)
 
 # BLE symbol rate: 1 Msym/s
 BLE_SYMBOL_RATE = 1000000
 
+# Longest possible advertising packet after the access address:
+# 2-byte header + 37-byte payload + 3-byte CRC
+MAX_PDU_BITS = (2 + 37 + 3) * 8
+
+
+def _whitening_sequence(channel: int, n_bits: int) -> np.ndarray:
+    """Generate the BLE whitening bit sequence for a channel.
+
+    7-bit LFSR (x^7 + x^4 + 1) seeded with the bit-reversed channel index;
+    whitening covers PDU + CRC, starting right after the access address.
+    """
+    # Bit-reverse the 6-bit channel index into bits 7..2, position 0 -> bit 1
+    swapped = int(f"{channel:08b}"[::-1], 2)
+    lfsr = swapped | 2
+    seq = np.empty(n_bits, dtype=np.int8)
+    for i in range(n_bits):
+        if lfsr & 0x80:
+            seq[i] = 1
+            lfsr ^= 0x11
+        else:
+            seq[i] = 0
+        lfsr = (lfsr << 1) & 0xFF
+    return seq
+
+
+# Precomputed per-channel whitening tables so dewhitening is one vector XOR
+WHITEN_TABLES = {ch: _whitening_sequence(ch, MAX_PDU_BITS) for ch in BLE_CHANNELS}
+
+
+def ble_dewhiten(data_bits: np.ndarray, channel: int) -> np.ndarray:
+    """Remove BLE channel whitening (vectorized XOR against precomputed table)."""
+    return data_bits ^ WHITEN_TABLES[channel][:len(data_bits)]
+
 # Samples per dwell
 SAMPLES_PER_DWELL = int(SAMPLE_RATE * CHANNEL_DWELL_MS / 1000)
 
+# Samples per symbol — the env vars are fixed at startup, so compute once
+# (4 at the default 4 MS/s rate)
+SAMPLES_PER_SYMBOL = SAMPLE_RATE // BLE_SYMBOL_RATE
+
 # CRC-24 polynomial for BLE (x^24 + x^10 + x^9 + x^6 + x^4 + x^3 + x + 1)
 BLE_CRC_POLY = 0x100065B
 BLE_CRC_INIT = 0x555555  # Advertising channel CRC init
 
-# Known BLE company identifiers (subset)
+# Known BLE company identifiers (subset), keyed by the raw uint16
 COMPANY_IDS = {
-    "004c": "Apple",
-    "0006": "Microsoft",
-    "004f": "Nordic Semiconductor",
-    "0059": "Nordic Semiconductor",
-    "0075": "Samsung",
-    "00e0": "Google",
-    "0157": "Tile",
-    "02ff": "Espressif",
+    0x004C: "Apple",
+    0x0006: "Microsoft",
+    0x004F: "Nordic Semiconductor",
+    0x0059: "Nordic Semiconductor",
+    0x0075: "Samsung",
+    0x00E0: "Google",
+    0x0157: "Tile",
+    0x02FF: "Espressif",
 }
 
 # BLE advertising PDU types
@@ -90,9 +150,27 @@ def compute_signature(protocol: str, key_parts: str) -> str:
     return hashlib.sha256(sig_input.encode()).hexdigest()
 
 
+# ble-energy signatures depend only on the channel; hash the three inputs
+# once at import instead of once per dwell
+ENERGY_SIGNATURES = {ch: compute_signature("ble-energy", f"channel={ch}")
+                     for ch in BLE_CHANNELS}
+
+
+# The same devices readvertise constantly, so memoize MAC digests instead
+# of re-hashing per packet (cleared wholesale if it ever fills)
+_MAC_HASH_CACHE: dict[bytes, str] = {}
+_MAC_HASH_CACHE_MAX = 4096
+
+
 def hash_mac(mac_bytes: bytes) -> str:
     """SHA-256 hash a MAC address for privacy, truncated to 16 hex chars."""
-    return hashlib.sha256(mac_bytes).hexdigest()[:16]
+    cached = _MAC_HASH_CACHE.get(mac_bytes)
+    if cached is None:
+        if len(_MAC_HASH_CACHE) >= _MAC_HASH_CACHE_MAX:
+            _MAC_HASH_CACHE.clear()
+        cached = hashlib.sha256(mac_bytes).hexdigest()[:16]
+        _MAC_HASH_CACHE[mac_bytes] = cached
+    return cached
 
 
 def now_iso() -> str:
@@ -104,79 +182,93 @@ def log(msg: str):
 
 
 def output(obs: dict):
-    print(json.dumps(obs), flush=True)
+    if orjson is not None:
+        line = orjson.dumps(obs) + b"\n"
+    else:
+        line = json.dumps(obs).encode() + b"\n"
+    sys.stdout.buffer.write(line)
 
 
-def crc24_ble(data: bytes) -> int:
-    """Compute BLE CRC-24 over data bytes."""
-    crc = BLE_CRC_INIT
-    for byte in data:
-        crc ^= byte << 16
+def flush_output():
+    """Push buffered observations downstream — called once per dwell
+    instead of one flush syscall per observation."""
+    sys.stdout.buffer.flush()
+
+
+def _build_crc24_table() -> tuple:
+    """Precompute the 256-entry byte-at-a-time (Sarwate) CRC-24 table."""
+    table = []
+    for byte in range(256):
+        crc = byte << 16
         for _ in range(8):
             if crc & 0x800000:
                 crc = (crc << 1) ^ BLE_CRC_POLY
             else:
                 crc = crc << 1
             crc &= 0xFFFFFF
+        table.append(crc)
+    return tuple(table)
+
+
+CRC24_TABLE = _build_crc24_table()
+
+
+def crc24_ble(data: bytes) -> int:
+    """Compute BLE CRC-24 over data bytes (table-driven, one step per byte)."""
+    crc = BLE_CRC_INIT
+    table = CRC24_TABLE
+    for byte in data:
+        crc = ((crc << 8) ^ table[((crc >> 16) ^ byte) & 0xFF]) & 0xFFFFFF
     return crc
 
 
 def bits_to_bytes(bits: np.ndarray) -> bytes:
     """Convert bit array to bytes (LSB first within each byte, BLE convention)."""
     n = len(bits) // 8
-    result = bytearray(n)
-    for i in range(n):
-        byte_bits = bits[i * 8:(i + 1) * 8]
-        # BLE is LSB first
-        val = 0
-        for j in range(8):
-            val |= int(byte_bits[j]) << j
-        result[i] = val
-    return bytes(result)
+    return np.packbits(np.asarray(bits[:n * 8], dtype=np.uint8),
+                       bitorder="little").tobytes()
 
 
 def parse_ad_structures(payload: bytes) -> dict:
     """Parse BLE advertising data (AD) structures."""
     fields: dict = {}
     i = 0
-    while i < len(payload):
-        if i + 1 >= len(payload):
-            break
+    end = len(payload)
+    while i + 1 < end:
         length = payload[i]
-        if length == 0 or i + 1 + length > len(payload):
+        if length == 0 or i + 1 + length > end:
             break
         ad_type = payload[i + 1]
         ad_data = payload[i + 2:i + 1 + length]
+        data_len = length - 1
 
         # 0x01: Flags
-        if ad_type == 0x01 and len(ad_data) >= 1:
+        if ad_type == 0x01 and data_len >= 1:
             fields["flags"] = ad_data[0]
 
         # 0x08/0x09: Shortened/Complete Local Name
         elif ad_type in (0x08, 0x09):
-            try:
-                fields["deviceName"] = ad_data.decode("utf-8", errors="replace")
-            except Exception:
-                pass
+            fields["deviceName"] = ad_data.decode("utf-8", errors="replace")
 
         # 0x0A: TX Power Level
-        elif ad_type == 0x0A and len(ad_data) >= 1:
-            fields["txPower"] = struct.unpack("b", ad_data[:1])[0]
+        elif ad_type == 0x0A and data_len >= 1:
+            tx = ad_data[0]
+            fields["txPower"] = tx - 256 if tx > 127 else tx
 
         # 0x02/0x03: Incomplete/Complete 16-bit UUID list
         elif ad_type in (0x02, 0x03):
-            if len(ad_data) >= 2 and len(ad_data) % 2 == 0:
-                uuids = []
-                for j in range(0, len(ad_data), 2):
-                    uuid16 = struct.unpack("<H", ad_data[j:j + 2])[0]
-                    uuids.append(f"{uuid16:04x}")
-                fields["serviceUuids"] = uuids
+            if data_len >= 2 and data_len % 2 == 0:
+                fields["serviceUuids"] = [
+                    f"{int.from_bytes(ad_data[j:j + 2], 'little'):04x}"
+                    for j in range(0, data_len, 2)
+                ]
 
         # 0xFF: Manufacturer Specific Data
-        elif ad_type == 0xFF and len(ad_data) >= 2:
-            company_id = f"{struct.unpack('<H', ad_data[:2])[0]:04x}"
-            fields["manufacturerId"] = company_id
-            fields["manufacturerName"] = COMPANY_IDS.get(company_id, "Unknown")
+        elif ad_type == 0xFF and data_len >= 2:
+            # Look up by the raw integer; format to hex only for emission
+            cid = int.from_bytes(ad_data[:2], "little")
+            fields["manufacturerId"] = f"{cid:04x}"
+            fields["manufacturerName"] = COMPANY_IDS.get(cid, "Unknown")
 
         i += 1 + length
 
@@ -185,11 +277,25 @@ def parse_ad_structures(payload: bytes) -> dict:
 
 class BleProcessor:
     def __init__(self):
-        # Dedup: signature -> last emission timestamp
-        self.last_seen: dict[str, float] = {}
+        # Dedup LRU: 64-bit signature prefix -> last emission timestamp,
+        # capped at DEDUP_MAX_ENTRIES (oldest evicted first)
+        self.last_seen: OrderedDict[int, float] = OrderedDict()
         self.energy_count = 0
         self.adv_count = 0
         self.hop_count = 0
+        # Reused per-dwell conversion buffer: interleaved float32 I/Q pairs,
+        # handed out as a complex64 view (capture/process is synchronous, so
+        # reuse across dwells is safe)
+        self._f32_buf = np.empty(SAMPLES_PER_DWELL * 2, dtype=np.float32)
+        # Persistent capture buffer — hackrf_transfer output is read straight
+        # into it (no per-hop bytes objects); also serves the integer demod
+        self._raw_buf = np.empty(SAMPLES_PER_DWELL * 2, dtype=np.int8)
+        # Raw int8 samples of the current dwell (set by capture_channel);
+        # the demod runs on these directly, skipping the float path
+        self._raw_i8: Optional[np.ndarray] = None
+        # Per-sample power of the current dwell (set by process_energy and
+        # reused for per-packet RSSI instead of a second pass over the IQ)
+        self._power: Optional[np.ndarray] = None
 
     def capture_channel(self, channel: int, freq_hz: int) -> Optional[np.ndarray]:
         """Capture IQ samples from a single BLE channel via hackrf_transfer."""
@@ -200,52 +306,98 @@ class BleProcessor:
             "-s", str(SAMPLE_RATE),
             "-l", str(LNA_GAIN),
             "-g", str(VGA_GAIN),
-            "-n", str(SAMPLES_PER_DWELL * 2),  # 2 bytes per I/Q sample
+            "-n", str(SAMPLES_PER_DWELL),  # counted in I/Q pairs (2 bytes each)
         ]
         if HACKRF_SERIAL:
             cmd.extend(["-d", HACKRF_SERIAL])
 
+        n_bytes = SAMPLES_PER_DWELL * 2
         try:
-            result = subprocess.run(
+            proc = subprocess.Popen(
                 cmd,
-                capture_output=True,
-                timeout=CHANNEL_DWELL_MS / 1000 + 5,  # generous timeout
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                bufsize=0,
             )
-            if result.returncode != 0:
-                return None
-
-            raw = result.stdout
-            if len(raw) < SAMPLES_PER_DWELL * 2:
-                return None
-
-            # Convert signed 8-bit I/Q to complex64
-            iq_int8 = np.frombuffer(raw[:SAMPLES_PER_DWELL * 2], dtype=np.int8)
-            iq = (iq_int8[0::2] + 1j * iq_int8[1::2]).astype(np.complex64) / 128.0
-            return iq
-
-        except (subprocess.TimeoutExpired, FileNotFoundError, OSError) as e:
+        except (FileNotFoundError, OSError) as e:
             log(f"hackrf_transfer error: {e}")
             return None
 
-    def process_energy(self, channel: int, freq_hz: int, iq: np.ndarray):
-        """Phase 2a: Energy detection on the captured IQ data."""
-        power = np.abs(iq) ** 2
+        # Stream stdout straight into the persistent capture buffer while the
+        # capture is still running — no per-hop bytes objects, and the USB
+        # transfer overlaps our reads
+        mv = memoryview(self._raw_buf)
+        got = 0
+        deadline = time.monotonic() + CHANNEL_DWELL_MS / 1000 + 5  # generous
+        fd = proc.stdout.fileno()
+        try:
+            while got < n_bytes:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    log("hackrf_transfer timeout")
+                    return None
+                ready, _, _ = select.select([fd], [], [], remaining)
+                if not ready:
+                    log("hackrf_transfer timeout")
+                    return None
+                nread = os.readv(fd, [mv[got:]])
+                if nread == 0:  # EOF before full dwell
+                    return None
+                got += nread
+        finally:
+            if got >= n_bytes:
+                # -n matches what we consumed, so the child has written its
+                # last byte and exits on its own
+                try:
+                    proc.wait(timeout=2)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.wait()
+            else:
+                # Timeout/EOF path — the child may be blocked mid-write on a
+                # full pipe, so don't linger before killing it
+                proc.kill()
+                proc.wait()
+
+        # Convert signed 8-bit I/Q to complex64: scale into the persistent
+        # float32 buffer in a single pass (the old strided-add built a
+        # complex128 intermediate plus a divided copy) and view the
+        # interleaved pairs as complex64
+        self._raw_i8 = self._raw_buf  # kept for the integer demod path
+        np.multiply(self._raw_buf, np.float32(1 / 128.0), out=self._f32_buf)
+        return self._f32_buf.view(np.complex64)
+
+    def process_energy(self, channel: int, freq_hz: int,
+                       iq: np.ndarray) -> tuple:
+        """Phase 2a: Energy detection on the captured IQ data.
+
+        Returns (burst_count, snr) so the caller can skip the packet
+        decode pass on dwells with nothing to find."""
+        # |iq|^2 from the real/imag views — np.abs on complex takes a sqrt
+        # (hypot) pass only for us to square it again; square the components
+        # directly and accumulate in place
+        re = iq.real
+        im = iq.imag
+        power = re * re
+        power += im * im
+        self._power = power  # shared with the packet path for RSSI
         mean_power = float(np.mean(power))
         peak_power = float(np.max(power))
 
-        # Convert to dBm (approximate, relative to full scale)
-        rssi = 10 * np.log10(peak_power + 1e-12)
-        noise = 10 * np.log10(mean_power + 1e-12)
+        # Convert to dBm (approximate, relative to full scale); these are
+        # Python floats, so math.log10 skips the NumPy scalar dispatch
+        rssi = 10 * math.log10(peak_power + 1e-12)
+        noise = 10 * math.log10(mean_power + 1e-12)
         snr = rssi - noise if noise < rssi else 0.0
 
-        # Detect energy bursts: segments where power exceeds 2x mean
+        # Detect energy bursts: segments where power exceeds 2x mean.
+        # A burst start is a below->above transition: above[i] & ~above[i-1],
+        # counted in one pass on the bool mask (no int8 copy, no diff pass)
         threshold = mean_power * 2
         above = power > threshold
-        # Count transitions from below to above threshold
-        transitions = np.diff(above.astype(np.int8))
-        burst_count = int(np.sum(transitions == 1))
+        burst_count = int(np.count_nonzero(above[1:] & ~above[:-1]))
 
-        sig = compute_signature("ble-energy", f"channel={channel}")
+        sig = ENERGY_SIGNATURES[channel]
 
         obs = {
             "observedAt": now_iso(),
@@ -265,30 +417,40 @@ class BleProcessor:
         }
         output(obs)
         self.energy_count += 1
+        return burst_count, snr
 
     def process_packets(self, channel: int, freq_hz: int, iq: np.ndarray):
         """Phase 2b: GFSK demodulation and BLE advertising packet decode."""
         if len(iq) < 100:
             return
 
-        # FM demodulation: instantaneous frequency via phase difference
-        phase_diff = np.angle(iq[1:] * np.conj(iq[:-1]))
+        # FM demodulation: the bit decision only needs the sign of the
+        # inter-sample phase difference, and sign(angle(a * conj(b))) equals
+        # the sign of the cross product Im(a * conj(b)). The sign is also
+        # scale-invariant, so work on the raw int8 samples in int16 (products
+        # of two int8 fit) — half the bandwidth of the float32 path and no
+        # dependence on the scaled conversion.
+        raw = self._raw_i8
+        if raw is not None and len(raw) == 2 * len(iq):
+            re = raw[0::2].astype(np.int16)
+            im = raw[1::2].astype(np.int16)
+        else:  # iq supplied without a capture (shouldn't happen in the loop)
+            re = iq.real
+            im = iq.imag
+        cross = im[1:] * re[:-1] - re[1:] * im[:-1]
 
         # Integrate-and-dump to symbol rate
-        samples_per_symbol = SAMPLE_RATE // BLE_SYMBOL_RATE
-        if samples_per_symbol < 1:
+        if SAMPLES_PER_SYMBOL < 1:
             return
 
-        n_symbols = len(phase_diff) // samples_per_symbol
+        n_symbols = len(cross) // SAMPLES_PER_SYMBOL
         if n_symbols < 64:  # Need at least preamble + access address + header
             return
 
-        # Reshape and average each symbol period
-        trimmed = phase_diff[:n_symbols * samples_per_symbol]
-        symbols_avg = trimmed.reshape(n_symbols, samples_per_symbol).mean(axis=1)
-
-        # Threshold to bits (positive = 1, negative = 0 for GFSK)
-        bits = (symbols_avg > 0).astype(np.int8)
+        # Sum each symbol period and threshold (positive = 1 for GFSK)
+        trimmed = cross[:n_symbols * SAMPLES_PER_SYMBOL]
+        symbol_sums = trimmed.reshape(n_symbols, SAMPLES_PER_SYMBOL).sum(axis=1)
+        bits = (symbol_sums > 0).astype(np.int8)
 
         # Search for BLE access address
         self._find_and_decode_packets(bits, channel, freq_hz, iq)
@@ -303,12 +465,34 @@ class BleProcessor:
         if n <= 0:
             return
 
-        for i in range(n):
-            # Check match (allowing 1 bit error for robustness)
-            mismatches = np.sum(bits[i:i + aa_len] != BLE_AA_BITS)
-            if mismatches > 1:
-                continue
+        # Two-pass vectorized correlation (allowing 1 bit error overall):
+        # a coarse filter on the last 8 AA bits rules out ~96% of positions
+        # with 8 shifted whole-array compares; only the survivors get the
+        # remaining 24 bits checked, via gathers over the few coarse hits
+        mismatches = np.zeros(n, dtype=np.int16)
+        for k in range(24, aa_len):
+            mismatches += bits[k:k + n] != BLE_AA_BITS[k]
+        coarse = np.flatnonzero(mismatches <= 1)
+
+        fine = mismatches[coarse]
+        for k in range(24):
+            fine = fine + (bits[coarse + k] != BLE_AA_BITS[k])
+        candidates = coarse[fine <= 1]
+        if candidates.size == 0:
+            return
+
+        # One wallclock stamp per dwell — second-resolution timestamps are
+        # identical across a 200 ms dwell and strftime is not free
+        dwell_ts = now_iso()
 
+        # Once a packet verifies, candidates inside its span are just echoes
+        # of the same bits — skip past them instead of re-decoding
+        skip_until = -1
+
+        for i in candidates:
+            i = int(i)
+            if i < skip_until:
+                continue
             # Found access address at position i
             pdu_start = i + aa_len
             remaining_bits = bits[pdu_start:]
@@ -316,38 +500,38 @@ class BleProcessor:
             if len(remaining_bits) < 16:  # Need at least PDU header (2 bytes)
                 continue
 
-            # Extract PDU header (2 bytes = 16 bits)
-            header_bytes = bits_to_bytes(remaining_bits[:16])
-            if len(header_bytes) < 2:
+            # PDU + CRC are whitened on-air; remove before parsing, then
+            # pack the whole candidate into bytes in one packbits call —
+            # header, payload and CRC are slices of the same buffer instead
+            # of three separate bit-pack passes
+            remaining_bits = ble_dewhiten(
+                remaining_bits[:MAX_PDU_BITS], channel)
+            pkt = bits_to_bytes(remaining_bits)
+            if len(pkt) < 2:  # Need at least PDU header (2 bytes)
                 continue
 
-            pdu_type = header_bytes[0] & 0x0F
-            tx_add = (header_bytes[0] >> 6) & 0x01  # 1 = random address
-            payload_length = header_bytes[1] & 0x3F
+            pdu_type = pkt[0] & 0x0F
+            tx_add = (pkt[0] >> 6) & 0x01  # 1 = random address
+            payload_length = pkt[1] & 0x3F
 
             # Sanity check
             if payload_length < 6 or payload_length > 37:
                 continue
 
             total_bits_needed = 16 + payload_length * 8 + 24  # header + payload + CRC
-            if len(remaining_bits) < total_bits_needed:
+            if len(pkt) < 2 + payload_length + 3:
                 continue
 
-            # Extract payload
-            payload_bits = remaining_bits[16:16 + payload_length * 8]
-            payload_bytes = bits_to_bytes(payload_bits)
-
-            # Extract CRC (3 bytes)
-            crc_bits = remaining_bits[16 + payload_length * 8:
-                                      16 + payload_length * 8 + 24]
-            crc_bytes = bits_to_bytes(crc_bits)
+            payload_bytes = pkt[2:2 + payload_length]
+            crc_bytes = pkt[2 + payload_length:2 + payload_length + 3]
             received_crc = (crc_bytes[0] | (crc_bytes[1] << 8) |
-                            (crc_bytes[2] << 16)) if len(crc_bytes) >= 3 else 0
+                            (crc_bytes[2] << 16))
 
-            # Verify CRC
-            crc_data = header_bytes + payload_bytes
-            computed_crc = crc24_ble(crc_data)
+            # Verify CRC over header + payload (one contiguous slice)
+            computed_crc = crc24_ble(pkt[:2 + payload_length])
             crc_valid = received_crc == computed_crc
+            if crc_valid:
+                skip_until = pdu_start + total_bits_needed
 
             # Extract MAC address (first 6 bytes of payload)
             if len(payload_bytes) < 6:
@@ -363,14 +547,19 @@ class BleProcessor:
 
             # Compute signal metrics from IQ at this position
             # Approximate sample position
-            samples_per_symbol = SAMPLE_RATE // BLE_SYMBOL_RATE
-            sample_start = i * samples_per_symbol
-            sample_end = min(sample_start + total_bits_needed * samples_per_symbol // 8,
+            sample_start = i * SAMPLES_PER_SYMBOL
+            sample_end = min(sample_start + total_bits_needed * SAMPLES_PER_SYMBOL // 8,
                              len(iq))
             if sample_start < len(iq):
-                packet_iq = iq[sample_start:sample_end]
-                pkt_power = np.abs(packet_iq) ** 2
-                rssi = float(10 * np.log10(np.mean(pkt_power) + 1e-12))
+                power = self._power
+                if power is not None and len(power) == len(iq):
+                    # Reuse the dwell power computed by process_energy
+                    pkt_power = power[sample_start:sample_end]
+                else:
+                    packet_iq = iq[sample_start:sample_end]
+                    pkt_power = (packet_iq.real * packet_iq.real +
+                                 packet_iq.imag * packet_iq.imag)
+                rssi = 10 * math.log10(float(np.mean(pkt_power)) + 1e-12)
             else:
                 rssi = -99.0
 
@@ -380,10 +569,18 @@ class BleProcessor:
                 f"macHash={mac_hash}&advType={adv_type}"
             )
 
+            # Key on the first 64 bits of the signature — plenty for dedup,
+            # 8x smaller than the full hex string
+            dedup_key = int(sig[:16], 16)
             now = time.time()
-            if sig in self.last_seen and (now - self.last_seen[sig]) < DEDUP_SECONDS:
+            last = self.last_seen.get(dedup_key)
+            if last is not None and (now - last) < DEDUP_SECONDS:
+                self.last_seen.move_to_end(dedup_key)
                 continue
-            self.last_seen[sig] = now
+            self.last_seen[dedup_key] = now
+            self.last_seen.move_to_end(dedup_key)
+            if len(self.last_seen) > DEDUP_MAX_ENTRIES:
+                self.last_seen.popitem(last=False)
 
             # Build observation
             fields = {
@@ -396,7 +593,7 @@ class BleProcessor:
             fields.update(ad_fields)
 
             obs = {
-                "observedAt": now_iso(),
+                "observedAt": dwell_ts,
                 "protocol": "ble-adv",
                 "frequencyHz": freq_hz,
                 "rssi": round(rssi, 1),
@@ -409,12 +606,6 @@ class BleProcessor:
             output(obs)
             self.adv_count += 1
 
-    def cleanup_dedup(self):
-        """Remove stale dedup entries."""
-        now = time.time()
-        cutoff = now - DEDUP_SECONDS * 2
-        self.last_seen = {k: v for k, v in self.last_seen.items() if v > cutoff}
-
     def run(self):
         """Main capture loop: hop across BLE advertising channels."""
         log("Starting BLE capture processor")
@@ -436,17 +627,16 @@ class BleProcessor:
                         continue
 
                     # Phase 2a: Energy detection (always)
-                    self.process_energy(channel, freq_hz, iq)
+                    burst_count, snr = self.process_energy(channel, freq_hz, iq)
 
-                    # Phase 2b: Packet decoding (always attempt)
-                    self.process_packets(channel, freq_hz, iq)
+                    # Phase 2b: Packet decoding — skipped when the energy
+                    # detector saw nothing worth demodulating
+                    if FORCE_DECODE or burst_count > 0 or snr > DECODE_MIN_SNR_DB:
+                        self.process_packets(channel, freq_hz, iq)
 
+                    flush_output()
                     self.hop_count += 1
 
-                # Periodic cleanup
-                if self.hop_count % 30 == 0:
-                    self.cleanup_dedup()
-
                 # Log progress periodically
                 if self.hop_count % 100 == 0:
                     log(f"Hops: {self.hop_count}, Energy: {self.energy_count}, "
@@ -456,6 +646,7 @@ class BleProcessor:
         except KeyboardInterrupt:
             pass
         finally:
+            flush_output()
             log(f"Stopped. Hops: {self.hop_count}, Energy: {self.energy_count}, "
                 f"Packets: {self.adv_count}")
 
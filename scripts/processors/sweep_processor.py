@@ -19,13 +19,17 @@ import sys
 import os
 import json
 import hashlib
-import math
 import time
 from datetime import datetime, timezone
 from typing import Optional
 
 import numpy as np
 
+try:
+    import orjson  # optional accelerator — stdlib json is the fallback
+except ImportError:
+    orjson = None
+
 
 # --- Configuration ---
 BASELINE_SECONDS = int(os.environ.get("SWEEP_BASELINE_SECONDS", "300"))
@@ -75,125 +79,201 @@ def freq_to_band_name(freq_hz: float) -> str:
     return f"{mhz}M"
 
 
-class BinStats:
-    """Welford's online algorithm for running mean/variance, with EMA mode."""
-
-    __slots__ = ("count", "mean", "m2", "ema_mean", "ema_var", "learning",
-                 "last_seen")
+class SweepProcessor:
+    # Initial capacity for the per-bin statistic arrays (grown by doubling)
+    INITIAL_BIN_CAPACITY = 1024
 
     def __init__(self):
-        self.count: int = 0
-        self.mean: float = 0.0
-        self.m2: float = 0.0
-        self.ema_mean: float = 0.0
-        self.ema_var: float = 0.0
-        self.learning: bool = True
-        self.last_seen: float = time.monotonic()
-
-    def update(self, value: float):
-        self.last_seen = time.monotonic()
-        if self.learning:
-            self.count += 1
-            delta = value - self.mean
-            self.mean += delta / self.count
-            delta2 = value - self.mean
-            self.m2 += delta * delta2
-        else:
-            # Exponential moving average
-            delta = value - self.ema_mean
-            self.ema_mean += EMA_ALPHA * delta
-            self.ema_var = (1 - EMA_ALPHA) * (self.ema_var + EMA_ALPHA * delta * delta)
-
-    def finalize_learning(self):
-        """Transition from learning to EMA tracking."""
-        self.learning = False
-        self.ema_mean = self.mean
-        self.ema_var = self.variance
-        if self.ema_var < 0.1:
-            self.ema_var = 0.1  # Floor to avoid zero-variance false positives
-
-    @property
-    def variance(self) -> float:
-        if self.count < 2:
-            return 0.0
-        return self.m2 / (self.count - 1)
-
-    @property
-    def stddev(self) -> float:
-        if self.learning:
-            return math.sqrt(self.variance) if self.variance > 0 else 0.0
-        return math.sqrt(self.ema_var) if self.ema_var > 0 else 0.0
-
-    @property
-    def current_mean(self) -> float:
-        return self.mean if self.learning else self.ema_mean
-
-    def deviation_sigma(self, value: float) -> float:
-        sd = self.stddev
-        if sd < 0.01:
-            return 0.0
-        return (value - self.current_mean) / sd
-
+        # Per-bin statistics as parallel arrays (struct-of-arrays) so a whole
+        # sweep row updates in a few vectorized ops instead of one Python
+        # method call per bin. Welford's online mean/variance during the
+        # learning phase, EMA tracking afterwards.
+        # bin_key (center_freq_hz) -> dense index into the arrays
+        self._freq_to_idx: dict[int, int] = {}
+        self._n_bins = 0
+        cap = self.INITIAL_BIN_CAPACITY
+        self._count = np.zeros(cap, dtype=np.int64)
+        self._mean = np.zeros(cap, dtype=np.float64)
+        self._m2 = np.zeros(cap, dtype=np.float64)
+        self._ema_mean = np.zeros(cap, dtype=np.float64)
+        self._ema_var = np.zeros(cap, dtype=np.float64)
+        self._bin_learning = np.ones(cap, dtype=bool)
+        self._last_seen = np.zeros(cap, dtype=np.float64)
+
+        # hackrf_sweep repeats identical rows every sweep, so memoize the
+        # (hz_low, bin_width, n_bins) -> (indices, centers, freq_set)
+        # mapping: one dict hit per row instead of one per bin (cleared
+        # when bins are evicted)
+        self._row_cache: dict[tuple, tuple[np.ndarray, np.ndarray, set]] = {}
+
+        # Band name -> bin index array for baseline summaries, rebuilt
+        # lazily whenever the bin set changes
+        self._band_idx: Optional[dict[str, np.ndarray]] = None
 
-class SweepProcessor:
-    def __init__(self):
-        # bin_key (center_freq_hz) -> BinStats
-        self.bins: dict[int, BinStats] = {}
         # bin_key -> consecutive anomaly count
         self.streaks: dict[int, int] = {}
         # bin_key -> already emitted (dedup within streak)
         self.emitted: dict[int, bool] = {}
 
+        # Signature inputs are fully determined by (protocol, key_parts) and
+        # only a handful of band/type combinations exist — memoize instead
+        # of re-running SHA-256 per emission
+        self._sig_cache: dict[tuple[str, str], str] = {}
+
+        # Wallclock stamp shared by all observations emitted for one row
+        # (lazily computed — most rows emit nothing)
+        self._row_ts: Optional[str] = None
+
         self.start_time: Optional[float] = None
         self.learning = True
         self.sweep_count = 0
         self.anomaly_count = 0
 
+    @property
+    def bin_count(self) -> int:
+        return self._n_bins
+
+    def _add_bin(self, freq_hz: int) -> int:
+        """Register a new bin, growing the stat arrays if needed."""
+        idx = self._n_bins
+        if idx >= len(self._count):
+            for name in ("_count", "_mean", "_m2", "_ema_mean", "_ema_var",
+                         "_bin_learning", "_last_seen"):
+                old = getattr(self, name)
+                grown = np.zeros(len(old) * 2, dtype=old.dtype)
+                grown[:idx] = old[:idx]
+                setattr(self, name, grown)
+            self._bin_learning[idx:] = True
+        self._freq_to_idx[freq_hz] = idx
+        self._n_bins = idx + 1
+        self._band_idx = None  # band membership changed
+        return idx
+
+    def _indices_for(self, centers: np.ndarray) -> np.ndarray:
+        """Map row center frequencies to dense bin indices, registering new
+        bins on first encounter."""
+        lookup = self._freq_to_idx
+        idx = np.empty(len(centers), dtype=np.int64)
+        for j, freq in enumerate(centers.tolist()):
+            i = lookup.get(freq)
+            if i is None:
+                i = self._add_bin(freq)
+            idx[j] = i
+        return idx
+
+    def _update_bins(self, idx: np.ndarray, values: np.ndarray):
+        """Batched Welford/EMA update for one sweep row (vectorized)."""
+        self._last_seen[idx] = time.monotonic()
+        learning = self._bin_learning[idx]
+        if learning.any():
+            li = idx[learning]
+            lv = values[learning]
+            counts = self._count[li] + 1
+            self._count[li] = counts
+            delta = lv - self._mean[li]
+            means = self._mean[li] + delta / counts
+            self._mean[li] = means
+            self._m2[li] += delta * (lv - means)
+        if not learning.all():
+            ei = idx[~learning]
+            ev = values[~learning]
+            delta = ev - self._ema_mean[ei]
+            self._ema_mean[ei] += EMA_ALPHA * delta
+            self._ema_var[ei] = ((1 - EMA_ALPHA) *
+                                 (self._ema_var[ei] + EMA_ALPHA * delta * delta))
+
+    def _row_sigma(self, idx: np.ndarray, values: np.ndarray):
+        """Deviation of a whole row from its baselines, in standard deviations.
+
+        Returns (sigma, means) arrays; bins with a near-zero spread get
+        sigma 0 so they never trip the anomaly threshold."""
+        learning = self._bin_learning[idx]
+        counts = self._count[idx]
+        variance = np.where(learning,
+                            self._m2[idx] / np.maximum(counts - 1, 1),
+                            self._ema_var[idx])
+        variance[learning & (counts < 2)] = 0.0
+        means = np.where(learning, self._mean[idx], self._ema_mean[idx])
+        sd = np.sqrt(np.maximum(variance, 0.0))
+        sigma = np.zeros(len(values))
+        valid = sd >= 0.01
+        sigma[valid] = (values[valid] - means[valid]) / sd[valid]
+        return sigma, means
+
+    def _signature_for(self, protocol: str, key_parts: str) -> str:
+        """Memoized compute_signature — the inputs are deterministic."""
+        key = (protocol, key_parts)
+        sig = self._sig_cache.get(key)
+        if sig is None:
+            sig = compute_signature(protocol, key_parts)
+            self._sig_cache[key] = sig
+        return sig
+
+    def _ts(self) -> str:
+        """Timestamp for the current row, computed at most once per row."""
+        if self._row_ts is None:
+            self._row_ts = now_iso()
+        return self._row_ts
+
     def process_line(self, line: str):
         """Parse one hackrf_sweep CSV line and process all bins."""
         line = line.strip()
         if not line or line.startswith("#"):
             return
+        self._row_ts = None
 
-        parts = line.split(",")
+        # Split only the 6 header fields; the dB tail stays one string
+        parts = line.split(",", 6)
         if len(parts) < 7:
             return
 
         try:
             # hackrf_sweep CSV format:
             # date, time, hz_low, hz_high, hz_bin_width, num_samples, dB, dB, ...
-            date_str = parts[0].strip()
-            time_str = parts[1].strip()
-            hz_low = float(parts[2].strip())
-            hz_high = float(parts[3].strip())
-            hz_bin_width = float(parts[4].strip())
-            # parts[5] = num_samples (unused)
-            db_values = [float(v.strip()) for v in parts[6:] if v.strip()]
-        except (ValueError, IndexError):
+            # parts[0]/parts[1] = date/time, parts[5] = num_samples (unused)
+            hz_low = float(parts[2])
+            hz_high = float(parts[3])
+            hz_bin_width = float(parts[4])
+        except ValueError:
             return
 
+        try:
+            # Bulk float parse of the dB tail — one C-level conversion
+            # instead of float()/strip() per value
+            dbs = np.array(parts[6].split(","), dtype=np.float64)
+        except ValueError:
+            # Rare malformed tail (empty or junk segments): old slow path
+            try:
+                dbs = np.array([float(v) for v in parts[6].split(",")
+                                if v.strip()], dtype=np.float64)
+            except ValueError:
+                return
+
         if self.start_time is None:
-            self.start_time = datetime.now(timezone.utc).timestamp()
+            self.start_time = time.monotonic()
             self._log(f"Baseline learning started ({BASELINE_SECONDS}s)")
 
         # Check if learning phase is done
-        elapsed = datetime.now(timezone.utc).timestamp() - self.start_time
+        elapsed = time.monotonic() - self.start_time
         if self.learning and elapsed >= BASELINE_SECONDS:
             self._finalize_learning()
 
-        # Process each power bin
-        for i, db in enumerate(db_values):
-            center_freq = int(hz_low + hz_bin_width * i + hz_bin_width / 2)
-
-            if center_freq not in self.bins:
-                self.bins[center_freq] = BinStats()
-
-            stats = self.bins[center_freq]
-            stats.update(db)
+        # Process the whole row of power bins in one batched update
+        row_key = (hz_low, hz_bin_width, len(dbs))
+        cached = self._row_cache.get(row_key)
+        if cached is None:
+            centers = (hz_low + hz_bin_width * np.arange(len(dbs))
+                       + hz_bin_width / 2).astype(np.int64)
+            idx = self._indices_for(centers)
+            freq_set = set(centers.tolist())
+            self._row_cache[row_key] = (idx, centers, freq_set)
+        else:
+            idx, centers, freq_set = cached
+        self._update_bins(idx, dbs)
 
-            if not self.learning:
-                sigma = stats.deviation_sigma(db)
-                self._check_anomaly(center_freq, db, sigma, stats)
+        if not self.learning:
+            sigma, means = self._row_sigma(idx, dbs)
+            self._check_anomalies(centers, dbs, sigma, means, freq_set)
 
         # Track sweeps for baseline emission and periodic cleanup
         # A new "sweep" starts when we see hz_low near the beginning of the range
@@ -204,33 +284,54 @@ class SweepProcessor:
             if not self.learning and self.sweep_count % CLEANUP_INTERVAL == 0:
                 self._cleanup_stale_bins()
 
+        # _ts() is only touched by emitters, so a stamp means this row wrote
+        # observations that now need to reach the pipeline
+        if self._row_ts is not None:
+            sys.stdout.buffer.flush()
+
     def _finalize_learning(self):
-        """Transition all bins from learning to adaptive tracking."""
+        """Transition bins with enough data from learning to EMA tracking."""
         self.learning = False
-        valid = 0
-        for stats in self.bins.values():
-            if stats.count >= 3:
-                stats.finalize_learning()
-                valid += 1
-        self._log(f"Baseline learned: {valid} bins with data, "
-                  f"{len(self.bins)} total bins tracked")
-
-    def _check_anomaly(self, freq_hz: int, power_db: float, sigma: float,
-                       stats: BinStats):
-        """Check if a bin reading is anomalous and emit if streak threshold met."""
-        if sigma > ANOMALY_SIGMA:
-            self.streaks[freq_hz] = self.streaks.get(freq_hz, 0) + 1
-
-            if self.streaks[freq_hz] >= MIN_STREAK and not self.emitted.get(freq_hz, False):
-                self._emit_anomaly(freq_hz, power_db, stats.current_mean, sigma)
-                self.emitted[freq_hz] = True
+        n = self._n_bins
+        counts = self._count[:n]
+        ready = counts >= 3
+        self._ema_mean[:n][ready] = self._mean[:n][ready]
+        # Seed EMA variance from the learned sample variance, floored to
+        # avoid zero-variance false positives
+        variance = self._m2[:n][ready] / (counts[ready] - 1)
+        self._ema_var[:n][ready] = np.maximum(variance, 0.1)
+        self._bin_learning[:n][ready] = False
+        self._log(f"Baseline learned: {int(ready.sum())} bins with data, "
+                  f"{n} total bins tracked")
+
+    def _check_anomalies(self, centers: np.ndarray, values: np.ndarray,
+                         sigma: np.ndarray, means: np.ndarray,
+                         freq_set: set):
+        """Update anomaly streaks from one row's sigma vector.
+
+        The threshold comparison is done on the whole row at once; Python
+        only touches the (rarely more than a handful of) anomalous bins
+        plus any active streaks that dropped back below threshold."""
+        hot = np.flatnonzero(sigma > ANOMALY_SIGMA)
+        hot_freqs = set()
+        for j in hot.tolist():
+            freq = int(centers[j])
+            hot_freqs.add(freq)
+            streak = self.streaks.get(freq, 0) + 1
+            self.streaks[freq] = streak
+            if streak >= MIN_STREAK and not self.emitted.get(freq, False):
+                self._emit_anomaly(freq, float(values[j]), float(means[j]),
+                                   float(sigma[j]))
+                self.emitted[freq] = True
                 self.anomaly_count += 1
-        else:
-            # Reset streak
-            if freq_hz in self.streaks:
-                del self.streaks[freq_hz]
-            if freq_hz in self.emitted:
-                del self.emitted[freq_hz]
+
+        # Reset streaks for bins in this row that are no longer anomalous
+        if self.streaks:
+            stale = [f for f in self.streaks
+                     if f in freq_set and f not in hot_freqs]
+            for freq in stale:
+                del self.streaks[freq]
+                self.emitted.pop(freq, None)
 
     def _emit_anomaly(self, freq_hz: int, power_db: float,
                       baseline_db: float, sigma: float):
@@ -239,12 +340,12 @@ class SweepProcessor:
         anomaly_type = "power-spike" if power_db > baseline_db else "power-drop"
 
         obs = {
-            "observedAt": now_iso(),
+            "observedAt": self._ts(),
             "protocol": "spectrum-anomaly",
             "frequencyHz": freq_hz,
             "rssi": round(power_db, 1),
             "noise": round(baseline_db, 1),
-            "signature": compute_signature(
+            "signature": self._signature_for(
                 "spectrum-anomaly",
                 f"band={band}&type={anomaly_type}"
             ),
@@ -259,22 +360,26 @@ class SweepProcessor:
         }
         self._output(obs)
 
+    def _band_indices(self) -> dict:
+        """Band name -> array of bin indices, rebuilt only when the bin set
+        changes (new bins or stale-bin compaction)."""
+        if self._band_idx is None:
+            grouped: dict[str, list[int]] = {}
+            for freq_hz, idx in self._freq_to_idx.items():
+                grouped.setdefault(freq_to_band_name(freq_hz), []).append(idx)
+            self._band_idx = {band: np.array(idxs, dtype=np.int64)
+                              for band, idxs in grouped.items()}
+        return self._band_idx
+
     def _emit_baseline_summary(self):
         """Emit per-band baseline summaries."""
-        band_data: dict[str, list[float]] = {}
-
-        for freq_hz, stats in self.bins.items():
-            if stats.count < 3:
-                continue
-            band = freq_to_band_name(freq_hz)
-            if band not in band_data:
-                band_data[band] = []
-            band_data[band].append(stats.current_mean)
-
-        for band, powers in band_data.items():
-            if not powers:
+        for band, idx in self._band_indices().items():
+            # Only bins with enough samples for a meaningful baseline
+            sel = idx[self._count[idx] >= 3]
+            if sel.size == 0:
                 continue
-            arr = np.array(powers)
+            arr = np.where(self._bin_learning[sel],
+                           self._mean[sel], self._ema_mean[sel])
             # Pick a representative frequency for the band
             representative_freq = None
             for name, lo, hi in NAMED_BANDS:
@@ -286,12 +391,12 @@ class SweepProcessor:
                 representative_freq = 0
 
             obs = {
-                "observedAt": now_iso(),
+                "observedAt": self._ts(),
                 "protocol": "spectrum-baseline",
                 "frequencyHz": representative_freq,
                 "rssi": round(float(np.mean(arr)), 1),
                 "noise": round(float(np.min(arr)), 1),
-                "signature": compute_signature(
+                "signature": self._signature_for(
                     "spectrum-baseline",
                     f"band={band}"
                 ),
@@ -301,7 +406,7 @@ class SweepProcessor:
                     "minPower": round(float(np.min(arr)), 1),
                     "maxPower": round(float(np.max(arr)), 1),
                     "stdPower": round(float(np.std(arr)), 2),
-                    "binCount": len(powers),
+                    "binCount": int(sel.size),
                 },
             }
             self._output(obs)
@@ -309,19 +414,42 @@ class SweepProcessor:
     def _cleanup_stale_bins(self):
         """Evict bins (and their streak/emitted state) not updated recently."""
         cutoff = time.monotonic() - STALE_BIN_SECONDS
-        stale = [freq for freq, stats in self.bins.items()
-                 if stats.last_seen < cutoff]
-        for freq in stale:
-            del self.bins[freq]
-            self.streaks.pop(freq, None)
-            self.emitted.pop(freq, None)
-        if stale:
-            self._log(f"Cleaned {len(stale)} stale bins, "
-                      f"{len(self.bins)} remaining")
+        n = self._n_bins
+        keep = self._last_seen[:n] >= cutoff
+        n_keep = int(keep.sum())
+        if n_keep == n:
+            return
+
+        # Compact the stat arrays and remap the dense indices. Freed slots
+        # must be reset to their initial state — _add_bin hands them out
+        # assuming zeroed stats and learning=True
+        for name in ("_count", "_mean", "_m2", "_ema_mean", "_ema_var",
+                     "_bin_learning", "_last_seen"):
+            arr = getattr(self, name)
+            arr[:n_keep] = arr[:n][keep]
+            arr[n_keep:n] = 0
+        self._bin_learning[n_keep:n] = True
+        new_index = np.cumsum(keep) - 1
+        remapped: dict[int, int] = {}
+        for freq, idx in self._freq_to_idx.items():
+            if keep[idx]:
+                remapped[freq] = int(new_index[idx])
+            else:
+                self.streaks.pop(freq, None)
+                self.emitted.pop(freq, None)
+        self._freq_to_idx = remapped
+        self._row_cache.clear()  # cached indices are stale after remapping
+        self._band_idx = None
+        self._n_bins = n_keep
+        self._log(f"Cleaned {n - n_keep} stale bins, {n_keep} remaining")
 
     def _output(self, obs: dict):
-        """Write one NDJSON line to stdout."""
-        print(json.dumps(obs), flush=True)
+        """Write one NDJSON line to stdout (flushed once per row)."""
+        if orjson is not None:
+            line = orjson.dumps(obs) + b"\n"
+        else:
+            line = json.dumps(obs).encode() + b"\n"
+        sys.stdout.buffer.write(line)
 
     def _log(self, msg: str):
         """Log to stderr (not captured by pipeline)."""
@@ -342,7 +470,7 @@ def main():
     finally:
         processor._log(f"Stopped. Sweeps: {processor.sweep_count}, "
                        f"Anomalies: {processor.anomaly_count}, "
-                       f"Bins tracked: {len(processor.bins)}")
+                       f"Bins tracked: {processor.bin_count}")
 
 
 if __name__ == "__main__":